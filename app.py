@@ -1,9 +1,17 @@
 import streamlit as st
-import tempfile
+import gc
+import hashlib
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from rag_pipeline import EMBEDDING_MODEL, Chatbot, DocumentIndex, create_embeddings, create_llm
+from proximity_cache import ProximityCache
+import logging
 import os
-from rag_pipeline import Chatbot
 import traceback
 
+logger = logging.getLogger(__name__)
+
 # Page config
 st.set_page_config(
     page_title="RAG Chatbot",
@@ -12,113 +20,323 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS
-st.markdown("""
-<style>
-    .question-box { 
-        background-color: #e3f2fd; 
-        padding: 0.8rem; 
-        border-radius: 0.5rem; 
-        border-left: 4px solid #2196f3; 
-        margin: 0.5rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .answer-box { 
-        background-color: #f3e5f5; 
-        padding: 0.8rem; 
-        border-radius: 0.5rem; 
-        border-left: 4px solid #9c27b0; 
-        margin: 0.5rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .error-box {
-        background-color: #ffebee;
-        padding: 0.8rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #f44336;
-        margin: 0.5rem 0;
-    }
-    .success-box {
-        background-color: #e8f5e8;
-        padding: 0.8rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #4caf50;
-        margin: 0.5rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Only the most recent turns are kept (and re-rendered on each rerun)
+MAX_CHAT_HISTORY = 50
+
+# Indexes (and their answer caches) kept in memory across sessions; the
+# least recently used document is evicted beyond this
+MAX_CACHED_INDEXES = 4
+
+# Optional on-disk index cache, so restarts skip extraction and embedding.
+# Off unless the INDEX_CACHE_DIR secret is set, since saved indexes contain
+# the documents' text; only the MAX_DISK_INDEXES most recently used are kept
+MAX_DISK_INDEXES = 8
+
+# Overview questions from the "Gợi ý câu hỏi" list, answered ahead of time
+# right after a document is processed
+SUGGESTED_QUESTIONS = [
+    "Tài liệu này nói về chủ đề gì?",
+    "Tóm tắt nội dung chính của tài liệu",
+    "Những điểm quan trọng nhất trong tài liệu là gì?",
+]
 
 
 def init_session_state():
-    """Initialize session state variables"""
-    if "chatbot" not in st.session_state:
-        st.session_state.chatbot = None
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    if "pdf_processed" not in st.session_state:
-        st.session_state.pdf_processed = False
-    if "processing" not in st.session_state:
-        st.session_state.processing = False
-    if "current_pdf_name" not in st.session_state:
-        st.session_state.current_pdf_name = None
-
-
-def load_chatbot_from_bytes(pdf_bytes, api_key, pdf_name):
-    """Load chatbot from in-memory PDF bytes with improved error handling"""
-    temp_file = None
+    """Initialize session state variables (no-op for keys that already exist)"""
+    st.session_state.setdefault("chatbot", None)
+    st.session_state.setdefault("chat_history", deque(maxlen=MAX_CHAT_HISTORY))
+    st.session_state.setdefault("pdf_processed", False)
+    st.session_state.setdefault("processing", False)
+    st.session_state.setdefault("current_pdf_name", None)
+    st.session_state.setdefault("pdf_hash", None)
+    st.session_state.setdefault("index_job", None)
+
+
+def show_error_details(title="🔍 Chi tiết lỗi"):
+    """
+    Log the exception being handled; show its traceback only in debug mode.
+
+    Formatting a traceback walks every frame (hundreds inside LangChain), so
+    it is only sent to the browser when the DEBUG secret is set.
+    """
+    logger.exception("Unhandled error")
+    if st.secrets.get("DEBUG", False):
+        with st.expander(title):
+            st.code(traceback.format_exc())
+
+
+def compute_pdf_hash(pdf_bytes):
+    """Content hash of a PDF, used as cache key instead of a (temporary) file path"""
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
+
+def index_cache_root():
+    """Root of the on-disk index cache, or None when it is disabled"""
+    return st.secrets.get("INDEX_CACHE_DIR") or None
+
+
+def prune_index_cache():
+    """Delete all but the MAX_DISK_INDEXES most recently used saved indexes"""
+    cache_root = index_cache_root()
+    if not cache_root or not os.path.isdir(cache_root):
+        return
+        
+    # Cache trouble is never fatal (another build may be pruning concurrently)
     try:
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_bytes)
-            temp_file = tmp.name
-
-        # Initialize chatbot with error handling
-        st.info("🔄 Đang khởi tạo chatbot...")
-        bot = Chatbot(pdf_path=temp_file, google_api_key=api_key)
+        entries = []
+        for config_dir in os.scandir(cache_root):
+            if not config_dir.is_dir():
+                continue
+            for entry in os.scandir(config_dir.path):
+                if not entry.is_dir() or entry.name.startswith("tmp"):  # skip saves in progress
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue  # removed since the scan
+        entries.sort(reverse=True)
+        for _, path in entries[MAX_DISK_INDEXES:]:
+            logger.info(f"Evicting cached index {path}")
+            shutil.rmtree(path, ignore_errors=True)
+    except OSError as e:
+        logger.warning(f"Could not prune index cache {cache_root}: {e}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_embedder(embedding_model=EMBEDDING_MODEL):
+    """Local embedding model, loaded once per process"""
+    return create_embeddings(embedding_model)
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_CACHED_INDEXES)
+def get_index(pdf_hash, embedding_model, _pdf_bytes, _pdf_name):
+    """
+    Build the vector index for a PDF, cached on (pdf_hash, embedding_model).
+
+    This is the expensive step (extraction + embedding) and is shared by all
+    sessions. The model name is part of the key so that an index is never
+    reused with a different embedder (Streamlit keeps cache entries across
+    code reloads). Arguments with a leading underscore are not hashed by
+    Streamlit, so the PDF bytes are only hashed once (by compute_pdf_hash).
+    Failures raise so that they are never cached. If the on-disk cache is
+    enabled, the index is also saved there, so it survives restarts.
+    """
+    embedder = get_embedder(embedding_model)
+    index = DocumentIndex(embedder, pdf_stream=_pdf_bytes, pdf_name=_pdf_name,
+                          cache_root=index_cache_root(), cache_key=pdf_hash)
+    if not index.process_documents():
+        raise RuntimeError("Không thể khởi tạo chatbot")
+    prune_index_cache()
+    return index
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm(api_key):
+    """Gemini client, created once per API key and reused for every question (keeps its connection open)"""
+    return create_llm(api_key)
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_CACHED_INDEXES)
+def get_proximity_cache(pdf_hash, embedding_model):
+    """
+    Semantic answer cache for one document, shared across sessions.
+
+    Keyed on the embedding model too (like get_index), since cached query
+    embeddings are only comparable with those of the same model.
+    """
+    return ProximityCache(threshold=0.92)
+
+
+def stream_answer(query):
+    """
+    Render the answer to a question as it is generated and return its text.
+
+    A paraphrase of an earlier question (cosine similarity >= 0.92) is served
+    from the chatbot's proximity cache without calling the LLM; otherwise the
+    answer is streamed token by token. Errors raise.
+    """
+    return st.write_stream(st.session_state.chatbot.stream(query))
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    """Worker threads that build indexes off the Streamlit script thread"""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_executor():
+    """
+    Worker thread for speculative answer prefetching.
+
+    Kept apart from get_executor so index builds for other sessions never
+    queue behind prefetch LLM calls.
+    """
+    return ThreadPoolExecutor(max_workers=1)
+
+
+def uploaded_pdf_hash(uploaded_file):
+    """Content hash of an uploaded PDF, computed once per upload rather than per rerun"""
+    if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+        st.session_state.upload_file_id = uploaded_file.file_id
+        # getbuffer() is a zero-copy view of the upload
+        st.session_state.upload_hash = compute_pdf_hash(uploaded_file.getbuffer())
+    return st.session_state.upload_hash
+
+
+def release_document():
+    """
+    Drop this session's chatbot for the current document.
+
+    Called before a new document is indexed so the old retriever/QA chain
+    is not kept alive alongside the new index at peak memory.
+    """
+    st.session_state.chatbot = None
+    st.session_state.pdf_processed = False
+    st.session_state.current_pdf_name = None
+    st.session_state.pdf_hash = None
+    st.session_state.chat_history.clear()
+    gc.collect()
+
+
+def start_index_job(pdf_hash, pdf_bytes, pdf_name):
+    """Start building the index for an uploaded PDF in the background"""
+    release_document()
+    future = get_executor().submit(get_index, pdf_hash, EMBEDDING_MODEL, pdf_bytes, pdf_name)
+    
+    st.session_state.index_job = {"future": future, "pdf_hash": pdf_hash, "pdf_name": pdf_name}
+    st.session_state.processing = True
+
+
+def prefetch_answers(bot):
+    """
+    Answer SUGGESTED_QUESTIONS ahead of time, filling the chatbot's proximity cache.
+
+    Runs on the prefetch executor after a document is processed, so the first click on
+    a suggested question is answered instantly. Questions already cached
+    (e.g. from another session on the same PDF) are answered from the cache.
+    """
+    try:
+        for question in SUGGESTED_QUESTIONS:
+            bot.answer(question)
+    except Exception:
+        logger.exception("Failed to prefetch suggested answers")
+
+
+@st.fragment(run_every=1)
+def index_job_status(api_key):
+    """
+    Poll the background index build started by start_index_job.
+
+    While the build runs, only this fragment reruns (once per second), so
+    the rest of the app stays responsive. When it finishes, the chatbot is
+    created and the whole app reruns to pick it up.
+    """
+    job = st.session_state.index_job
+    if not job["future"].done():
+        st.status("🔧 Đang xử lý và tạo vector database...", state="running")
+        return
+    
+    st.session_state.index_job = None
+    st.session_state.processing = False
+    try:
+        # Identical PDFs reuse the cached index
+        index = job["future"].result()
+        st.session_state.chatbot = Chatbot(index=index, llm=get_llm(api_key),
+                                           answer_cache=get_proximity_cache(job["pdf_hash"], EMBEDDING_MODEL))
+        st.session_state.pdf_processed = True
+        st.session_state.current_pdf_name = job["pdf_name"]
+        st.session_state.pdf_hash = job["pdf_hash"]
+        st.session_state.index_job_result = ("success", None)
         
-        st.info("🔄 Đang xử lý tài liệu...")
-        success = bot.reset(temp_file, api_key)
+        # Warm the answer cache while the user switches to the chat tab
+        get_prefetch_executor().submit(prefetch_answers, st.session_state.chatbot)
+    except Exception as e:
+        logger.exception("Failed to build index")
+        st.session_state.index_job_result = ("error", str(e))
+    st.rerun()
+
+
+@st.fragment
+def chat_panel():
+    """
+    Chat tab: history, question input and suggestions.
+
+    Runs as a fragment, so submitting a question only reruns this panel
+    instead of the whole script (sidebar, upload tab).
+    """
+    if st.session_state.chatbot and st.session_state.pdf_processed:
+        # Messages are rendered above the input box
+        messages = st.container()
+        query = st.chat_input("Nhập câu hỏi của bạn:")
         
-        if success:
-            st.session_state.current_pdf_name = pdf_name
-            return bot
-        else:
-            st.error("❌ Không thể khởi tạo chatbot")
-            return None
+        with messages:
+            # Chat history
+            for question, answer in st.session_state.chat_history:
+                st.chat_message("user").write(question)
+                st.chat_message("assistant").write(answer)
             
-    except Exception as e:
-        error_msg = str(e)
-        st.error(f"❌ Lỗi khi khởi tạo chatbot: {error_msg}")
+            # Handle new question
+            if query and query.strip():
+                question = query.strip()
+                st.chat_message("user").write(question)
+                
+                with st.chat_message("assistant"):
+                    # Stream the answer (near-duplicate questions come from the cache)
+                    try:
+                        answer = stream_answer(question)
+                    except Exception as e:
+                        answer = Chatbot.format_error(e)
+                        st.error(answer)
+                        show_error_details()
+                
+                # Add to chat history once the full answer is known
+                st.session_state.chat_history.append((question, answer))
+
+        # Example questions
+        with st.expander("💡 Gợi ý câu hỏi"):
+            st.markdown("""
+            **Câu hỏi tổng quan:**
+            - Tài liệu này nói về chủ đề gì?
+            - Tóm tắt nội dung chính của tài liệu
+            - Những điểm quan trọng nhất trong tài liệu là gì?
+
+            **Câu hỏi chi tiết:**
+            - Giải thích về [khái niệm/thuật ngữ cụ thể]
+            - Có những phương pháp nào được đề cập?
+            - Kết luận của tác giả về [vấn đề] là gì?
+
+            **Câu hỏi phân tích:**
+            - So sánh giữa A và B trong tài liệu
+            - Ưu điểm và nhược điểm của phương pháp X?
+            - Tác giả đưa ra bằng chứng gì để hỗ trợ quan điểm?
+            """)
+
+    else:
+        st.info("⬆️ Vui lòng tải lên và xử lý file PDF ở tab 'Upload tài liệu' trước.")
         
-        # Show detailed error for debugging
-        with st.expander("🔍 Chi tiết lỗi (để debug)"):
-            st.code(traceback.format_exc())
+        # Getting started guide
+        st.markdown("""
+        ### 🚀 Bắt đầu sử dụng
         
-        return None
-    finally:
-        # Clean up temporary file
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
-
-
-def display_chat_message(question, answer, index):
-    """Display a single chat message with better formatting"""
-    st.markdown(f"""
-    <div class="question-box">
-        <strong>🙋 Câu hỏi {index}:</strong><br>
-        {question}
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown(f"""
-    <div class="answer-box">
-        <strong>🤖 Trả lời:</strong><br>
-        {answer}
-    </div>
-    """, unsafe_allow_html=True)
+        1. **Nhập API Key** vào sidebar
+        2. **Upload file PDF** ở tab "Upload tài liệu"
+        3. **Nhấn "Xử lý tài liệu"** và đợi hoàn thành
+        4. **Quay lại tab này** để bắt đầu chat
+        
+        ---
+        
+        ### ❓ Câu hỏi thường gặp
+        
+        **Q: Tại sao cần API Key?**  
+        A: Để sử dụng Google Gemini AI cho việc phân tích và trả lời câu hỏi.
+        
+        **Q: File PDF của tôi có được lưu trữ không?**  
+        A: Không, file chỉ xử lý tạm thời và không được lưu trữ lâu dài. Nếu quản trị viên bật bộ nhớ đệm chỉ mục (`INDEX_CACHE_DIR`), văn bản trích xuất của một số tài liệu gần nhất được lưu trên máy chủ để tải lại nhanh hơn.
+        
+        **Q: Chatbot có thể trả lời câu hỏi ngoài tài liệu không?**  
+        A: Không, chatbot chỉ trả lời dựa trên nội dung trong tài liệu PDF bạn upload.
+        """)
 
 
 def main():
@@ -169,7 +387,7 @@ def main():
         
         # Clear chat history button
         if st.button("🗑️ Xóa lịch sử chat", use_container_width=True):
-            st.session_state.chat_history = []
+            st.session_state.chat_history.clear()
             st.rerun()
 
         # Status section
@@ -207,66 +425,39 @@ def main():
         if uploaded_file:
             st.info(f"📄 File đã chọn: {uploaded_file.name} ({uploaded_file.size:,} bytes)")
         
-        # Processing section
-        if uploaded_file and api_key:
-            if not st.session_state.processing:
-                if st.button("🚀 Xử lý tài liệu", type="primary", use_container_width=True):
-                    st.session_state.processing = True
-                    
-                    # Create progress placeholder
-                    progress_placeholder = st.empty()
-                    
-                    try:
-                        with progress_placeholder.container():
-                            st.info("📖 Đang đọc file PDF...")
-                            
-                        # Read PDF bytes
-                        pdf_bytes = uploaded_file.read()
-                        
-                        with progress_placeholder.container():
-                            st.info("🔧 Đang xử lý và tạo vector database...")
-                        
-                        # Load chatbot
-                        chatbot = load_chatbot_from_bytes(pdf_bytes, api_key, uploaded_file.name)
-                        
-                        if chatbot:
-                            st.session_state.chatbot = chatbot
-                            st.session_state.pdf_processed = True
-                            st.session_state.chat_history = []
-                            
-                            # Clear progress and show success
-                            progress_placeholder.empty()
-                            
-                            st.markdown("""
-                            <div class="success-box">
-                                <strong>✅ Xử lý thành công!</strong><br>
-                                Bạn có thể chuyển sang tab "Chatbot" để bắt đầu hỏi đáp.
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.balloons()
-                        else:
-                            progress_placeholder.empty()
-                            st.markdown("""
-                            <div class="error-box">
-                                <strong>❌ Không thể xử lý file PDF</strong><br>
-                                Vui lòng thử lại hoặc chọn file PDF khác.
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                    except Exception as e:
-                        progress_placeholder.empty()
-                        st.error(f"❌ Lỗi: {str(e)}")
-                        with st.expander("🔍 Chi tiết lỗi"):
-                            st.code(traceback.format_exc())
-
-                    finally:
-                        st.session_state.processing = False
+        # Processing section (the index is built in the background)
+        if st.session_state.index_job:
+            index_job_status(api_key)
+        elif uploaded_file and api_key:
+            pdf_hash = uploaded_pdf_hash(uploaded_file)
+            if st.session_state.pdf_processed and pdf_hash == st.session_state.pdf_hash:
+                # Same content as the loaded document: nothing to rebuild
+                st.info("✅ Tài liệu này đã được xử lý. Chuyển sang tab \"Chatbot\" để hỏi đáp.")
+            elif st.button("🚀 Xử lý tài liệu", type="primary", use_container_width=True):
+                # getvalue keeps the upload buffer reusable
+                start_index_job(pdf_hash, uploaded_file.getvalue(), uploaded_file.name)
+                st.rerun()
                         
         elif not api_key:
             st.warning("⚠️ Vui lòng nhập API Key trước")
         elif not uploaded_file:
             st.info("📄 Chọn file PDF để bắt đầu")
+        
+        # Outcome of the last background build (shown once)
+        index_job_result = st.session_state.pop("index_job_result", None)
+        if index_job_result and index_job_result[0] == "success":
+            st.success(
+                "**Xử lý thành công!**  \n"
+                "Bạn có thể chuyển sang tab \"Chatbot\" để bắt đầu hỏi đáp.",
+                icon="✅"
+            )
+            st.balloons()
+        elif index_job_result:
+            st.error(
+                f"**Không thể xử lý file PDF:** {index_job_result[1]}  \n"
+                "Vui lòng thử lại hoặc chọn file PDF khác.",
+                icon="❌"
+            )
             
         # Tips section
         with st.expander("💡 Hướng dẫn sử dụng"):
@@ -292,99 +483,7 @@ def main():
 
     # Tab 2: Chatbot
     with tab2:
-        if st.session_state.chatbot and st.session_state.pdf_processed:
-            # Chat history
-            if st.session_state.chat_history:
-                st.subheader("📋 Lịch sử hội thoại")
-                
-                # Display chat messages
-                for i, (question, answer) in enumerate(st.session_state.chat_history, 1):
-                    display_chat_message(question, answer, i)
-                
-                st.markdown("---")
-
-            # Question input form
-            st.subheader("❓ Đặt câu hỏi mới")
-            
-            with st.form("question_form", clear_on_submit=True):
-                query = st.text_area(
-                    "Nhập câu hỏi của bạn:",
-                    height=100,
-                    placeholder="Ví dụ: Tài liệu này nói về chủ đề gì?",
-                    help="Đặt câu hỏi cụ thể về nội dung trong tài liệu PDF"
-                )
-                
-                col1, col2 = st.columns([1, 5])
-                
-                with col1:
-                    submit_button = st.form_submit_button("🚀 Gửi", type="primary", use_container_width=True)
-                
-                # Handle form submission
-                if submit_button and query.strip():
-                    with st.spinner("🤔 Đang tìm kiếm và phân tích..."):
-                        try:
-                            # Get answer from chatbot
-                            answer = st.session_state.chatbot.ask(query.strip())
-                            
-                            # Add to chat history
-                            st.session_state.chat_history.append((query.strip(), answer))
-                            
-                            # Display immediate response
-                            st.success("✅ Đã có câu trả lời!")
-                            display_chat_message(query.strip(), answer, len(st.session_state.chat_history))
-
-                        except Exception as e:
-                            st.error(f"❌ Lỗi khi xử lý câu hỏi: {str(e)}")
-                            with st.expander("🔍 Chi tiết lỗi"):
-                                st.code(traceback.format_exc())
-
-                elif submit_button and not query.strip():
-                    st.warning("⚠️ Vui lòng nhập câu hỏi trước khi gửi")
-
-            # Example questions
-            with st.expander("💡 Gợi ý câu hỏi"):
-                st.markdown("""
-                **Câu hỏi tổng quan:**
-                - Tài liệu này nói về chủ đề gì?
-                - Tóm tắt nội dung chính của tài liệu
-                - Những điểm quan trọng nhất trong tài liệu là gì?
-
-                **Câu hỏi chi tiết:**
-                - Giải thích về [khái niệm/thuật ngữ cụ thể]
-                - Có những phương pháp nào được đề cập?
-                - Kết luận của tác giả về [vấn đề] là gì?
-
-                **Câu hỏi phân tích:**
-                - So sánh giữa A và B trong tài liệu
-                - Ưu điểm và nhược điểm của phương pháp X?
-                - Tác giả đưa ra bằng chứng gì để hỗ trợ quan điểm?
-                """)
-
-        else:
-            st.info("⬆️ Vui lòng tải lên và xử lý file PDF ở tab 'Upload tài liệu' trước.")
-            
-            # Getting started guide
-            st.markdown("""
-            ### 🚀 Bắt đầu sử dụng
-            
-            1. **Nhập API Key** vào sidebar
-            2. **Upload file PDF** ở tab "Upload tài liệu"
-            3. **Nhấn "Xử lý tài liệu"** và đợi hoàn thành
-            4. **Quay lại tab này** để bắt đầu chat
-            
-            ---
-            
-            ### ❓ Câu hỏi thường gặp
-            
-            **Q: Tại sao cần API Key?**  
-            A: Để sử dụng Google Gemini AI cho việc phân tích và trả lời câu hỏi.
-            
-            **Q: File PDF của tôi có được lưu trữ không?**  
-            A: Không, file chỉ xử lý tạm thời và không được lưu trữ lâu dài.
-            
-            **Q: Chatbot có thể trả lời câu hỏi ngoài tài liệu không?**  
-            A: Không, chatbot chỉ trả lời dựa trên nội dung trong tài liệu PDF bạn upload.
-            """)
+        chat_panel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import threading
+from typing import List, Optional, Sequence
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ProximityCache:
+    def __init__(self, threshold: float = 0.92, max_entries: int = 256):
+        """
+        Approximate answer cache keyed on query embeddings (Proximity-style)
+
+        A lookup returns a previous answer when the cosine similarity between
+        the new query and a cached query is at least `threshold`, so
+        paraphrased questions skip retrieval and LLM generation.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum number of cached queries (least recently used
+                evicted first)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embeddings: Optional[np.ndarray] = None  # (N, d) float32, L2-normalized
+        self._answers: List[str] = []
+        self._last_used: List[int] = []  # clock value of each entry's last add/hit
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query_embedding: Sequence[float]) -> Optional[str]:
+        """
+        Find the cached answer for the most similar previous query
+
+        Args:
+            query_embedding: Embedding of the new query
+
+        Returns:
+            Cached answer, or None if no query is similar enough
+        """
+        query = self._normalize(query_embedding)
+        with self._lock:
+            if self._embeddings is None or not self._answers:
+                return None
+
+            # One matrix-vector product gives cosine similarity to every cached query
+            scores = self._embeddings @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                logger.info(f"Proximity cache hit (similarity {scores[best]:.3f})")
+                self._clock += 1
+                self._last_used[best] = self._clock
+                return self._answers[best]
+        return None
+
+    def add(self, query_embedding: Sequence[float], answer: str) -> None:
+        """
+        Store an answer for a query
+
+        Args:
+            query_embedding: Embedding of the query
+            answer: Answer to return for similar queries
+        """
+        query = self._normalize(query_embedding)[np.newaxis, :]
+        with self._lock:
+            self._clock += 1
+            if self._embeddings is None:
+                self._embeddings = query
+            elif len(self._answers) >= self.max_entries:
+                # Full: overwrite the least recently used entry in place
+                lru = self._last_used.index(min(self._last_used))
+                self._embeddings[lru] = query[0]
+                self._answers[lru] = answer
+                self._last_used[lru] = self._clock
+                return
+            else:
+                self._embeddings = np.vstack([self._embeddings, query])
+            self._answers.append(answer)
+            self._last_used.append(self._clock)
+
+    def __len__(self) -> int:
+        return len(self._answers)
@@ -1,131 +1,545 @@
+import functools
+import hashlib
+import io
+import math
 import os
+import platform
+import re
+import shutil
 import tempfile
-from typing import Optional, List
+import unicodedata
+from typing import BinaryIO, Iterator, Optional, List, Tuple, Union
 import logging
 
-# PDF processing
-import PyPDF2
-import fitz  # PyMuPDF as fallback
+# PDF processing (PyPDF2 is imported only when the fallback runs)
+import fitz  # PyMuPDF
+
+from proximity_cache import ProximityCache
+
+# Vector search
+import faiss
+import numpy as np
 
 # LangChain imports
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import GoogleGenerativeAI
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+import torch
 from langchain.chains import RetrievalQA
+from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Local multilingual embedding model (handles Vietnamese and English)
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Chunks per forward pass when embedding documents
+EMBED_BATCH_SIZE = 64
+# Recent query embeddings kept per embeddings instance (re-asked questions,
+# prefetch and proximity-cache lookups skip the forward pass)
+QUERY_CACHE_SIZE = 256
+# Run the embedding model as an int8 ONNX Runtime graph (VNNI/AVX2/NEON
+# int8 GEMM) instead of FP32 PyTorch; falls back to PyTorch if unavailable
+EMBEDDING_QUANTIZED = True
+# Run the embedding model on the GPU (FP16) when one is available
+EMBEDDING_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
-class Chatbot:
-    def __init__(self, pdf_path: str, google_api_key: str):
+
+def _available_cpus() -> int:
+    """
+    CPUs this process may actually use
+    
+    os.cpu_count() reports every logical CPU on the host; containers are
+    usually limited by an affinity mask and/or a cgroup CPU quota.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+        
+    try:
+        # cgroup v2 quota, e.g. "200000 100000" for 2 CPUs ("max" = no limit)
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Size torch's intra-op pool and FAISS's OpenMP pool to the CPUs this
+# process is allowed to use (affinity mask and cgroup quota), not the host's
+AVAILABLE_CPUS = _available_cpus()
+torch.set_num_threads(AVAILABLE_CPUS)
+faiss.omp_set_num_threads(AVAILABLE_CPUS)
+
+# Whitespace normalization, built once at import. The translation table
+# maps every whitespace and control character except "\n" to a plain space
+# (all Unicode whitespace lies below U+3001), so the regexes only need to
+# look at " " and "\n"
+_WS_TABLE = str.maketrans({
+    c: " " for c in map(chr, range(0x3001))
+    if c != "\n" and (c.isspace() or unicodedata.category(c) == "Cc")
+})
+_INLINE_WS_RE = re.compile(r" {2,}")
+_PARAGRAPH_BREAK_RE = re.compile(r" ?\n(?: ?\n)+ ?")  # blank lines between paragraphs
+_LINE_BREAK_RE = re.compile(r" ?\n ?")
+
+# Vector index types: "flat" (exact scan), "sq8" (exact scan over int8
+# codes), "hnsw" (graph ANN), "ivfpq_fs" (IVF + 4-bit PQ fast scan),
+# "binary" (sign-bit codes + FP32 re-rank) or "auto" (chosen from the
+# chunk count)
+INDEX_TYPES = ("auto", "flat", "sq8", "hnsw", "ivfpq_fs", "binary")
+# With index_type="auto", documents with this many chunks use HNSW instead
+# of the exact flat scan, and IVF-PQ fast scan from IVFPQ_MIN_CHUNKS on
+HNSW_MIN_CHUNKS = 2000
+IVFPQ_MIN_CHUNKS = 100_000
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 256
+IVF_NPROBE = 8
+# Binary-index candidates fetched per requested result for the FP32 re-rank
+BINARY_RERANK_FACTOR = 25
+# Bump when extraction, chunking or index-building logic changes, so indexes
+# saved to disk by older code are not reused (see DocumentIndex.fingerprint)
+INDEX_FORMAT_VERSION = 1
+
+# Replies to requests that never reach the LLM (shared by ask, aask and ask_many)
+NOT_INITIALIZED_MESSAGE = "❌ Chatbot chưa được khởi tạo. Vui lòng tải PDF trước."
+EMPTY_QUESTION_MESSAGE = "❓ Vui lòng nhập câu hỏi."
+
+# Answering instructions for the "stuff" QA chain. Only the user's question
+# is sent to the retriever; the instructions reach the LLM through the prompt
+QA_PROMPT = PromptTemplate(
+    template="""Dựa trên nội dung tài liệu được cung cấp, hãy trả lời câu hỏi sau một cách chi tiết và chính xác.
+
+Tài liệu:
+{context}
+
+Câu hỏi: {question}
+
+Hướng dẫn trả lời:
+1. Chỉ sử dụng thông tin có trong tài liệu
+2. Trả lời bằng tiếng Việt
+3. Nếu không tìm thấy thông tin, hãy nói rõ
+4. Trích dẫn cụ thể nếu có thể
+5. Trình bày một cách logic và dễ hiểu
+
+Trả lời:""",
+    input_variables=["context", "question"]
+)
+
+# Chunk boundaries, most to least preferred
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", " "]
+# Overlap between consecutive chunks, as a fraction of the chunk size
+# (1/8: enough to keep a sentence that straddles a boundary retrievable
+# without re-embedding a fifth of the document)
+CHUNK_OVERLAP_RATIO = 0.125
+# Chunk size in characters when the embeddings have no local tokenizer
+CHUNK_SIZE_CHARS = 1000
+# Chunks retrieved per question for CHUNK_SIZE_CHARS-character chunks; with
+# smaller token-sized chunks, k is scaled up to give the LLM about the same
+# amount of context (estimated at CHARS_PER_TOKEN characters per token)
+RETRIEVAL_K = 4
+CHARS_PER_TOKEN = 4
+
+
+def check_faiss_simd() -> None:
+    """
+    Warn if FAISS was loaded without its SIMD distance kernels on x86
+    
+    faiss-cpu ships generic, AVX2 and AVX-512 builds and loads the best one
+    the CPU supports; the generic build (old wheel, or a CPU/VM that hides
+    AVX2) makes every search several times slower.
+    """
+    if platform.machine().lower() not in ("x86_64", "amd64"):
+        return  # arm64 builds use NEON unconditionally
+        
+    compile_options = faiss.get_compile_options()
+    if "AVX2" not in compile_options and "AVX512" not in compile_options:
+        logger.warning(f"FAISS is running without AVX2 kernels (compile options: {compile_options!r}); "
+                       "install a recent faiss-cpu wheel or conda-forge::libfaiss-avx2")
+
+
+check_faiss_simd()
+
+
+def _onnx_int8_file() -> str:
+    """Pick the pre-quantized ONNX export that matches this CPU"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+        
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu_flags = f.read()
+    except OSError:
+        cpu_flags = ""
+        
+    if "avx512_vnni" in cpu_flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in cpu_flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_quint8_avx2.onnx"  # AVX2 export uses uint8 weights
+
+
+@functools.lru_cache(maxsize=None)
+def load_embedding_model(model_name: str, quantized: bool = EMBEDDING_QUANTIZED) -> SentenceTransformer:
+    """
+    Load a SentenceTransformer model once per process
+    
+    Every SentenceTransformerEmbeddings for the same model shares the
+    instance, so weights are read and the runtime is initialized only once.
+    With quantized=True the model's int8 ONNX export is run by ONNX
+    Runtime (needs optimum[onnxruntime]); if that fails, the FP32 PyTorch
+    model is used instead. On a GPU the PyTorch model is always used, in
+    half precision.
+    """
+    if EMBEDDING_DEVICE == "cuda":
+        logger.info(f"Loading embedding model {model_name} on CUDA (FP16)...")
+        return SentenceTransformer(model_name, device="cuda").half()
+        
+    if quantized:
+        onnx_file = _onnx_int8_file()
+        try:
+            logger.info(f"Loading embedding model {model_name} ({onnx_file})...")
+            return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                       model_kwargs={"file_name": onnx_file})
+        except Exception as e:
+            logger.warning(f"Quantized ONNX model unavailable, using PyTorch: {e}")
+            
+    logger.info(f"Loading embedding model {model_name}...")
+    return SentenceTransformer(model_name, device="cpu")
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantized: bool = EMBEDDING_QUANTIZED):
         """
-        Initialize RAG chatbot with FAISS vector store
+        LangChain embeddings backed by a local SentenceTransformer model
         
         Args:
-            pdf_path: Path to PDF file
-            google_api_key: Google Gemini API key
+            model_name: SentenceTransformer model name or path
+            quantized: Use the int8 ONNX Runtime model if available
         """
+        self.model_name = model_name
+        self.model = load_embedding_model(model_name, quantized)
+        # Per-instance cache; decorating the method would key it on self
+        self._embed_query_cached = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed document chunks
+        
+        Returns a (len(texts), dim) float32 array of unit-length vectors
+        rather than nested lists; FAISS and LangChain accept arrays, and this
+        skips boxing every float into a Python object.
+        """
+        return self.model.encode(
+            texts,
+            batch_size=EMBED_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query (unit length, like the documents), memoized on the text"""
+        return list(self._embed_query_cached(text))
+
+    def _encode_query(self, text: str) -> tuple:
+        """Run the model on one query; a tuple so cached values can't be mutated"""
+        return tuple(self.model.encode(
+            [text],
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )[0].tolist())
+
+
+def create_embeddings(model_name: str = EMBEDDING_MODEL) -> SentenceTransformerEmbeddings:
+    """Create the local embedding model used to index documents and queries"""
+    return SentenceTransformerEmbeddings(model_name)
+
+
+def create_llm(google_api_key: str) -> GoogleGenerativeAI:
+    """Create the Gemini LLM client used to generate answers"""
+    # The key is passed to the client only; setting os.environ would leak
+    # one session's key into every other session in the process
+    
+    # Use Gemini 1.5 Flash as requested. The gRPC transport keeps one
+    # persistent HTTP/2 channel per client, so reusing the client (see
+    # get_llm in app.py) avoids a TLS handshake per question.
+    return GoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        google_api_key=google_api_key,
+        temperature=0.1,
+        transport="grpc"
+    )
+
+
+class DocumentIndex:
+    def __init__(self, embeddings, pdf_path: Optional[str] = None,
+                 pdf_stream: Optional[Union[BinaryIO, bytes]] = None,
+                 pdf_name: Optional[str] = None, index_type: str = "auto",
+                 cache_root: Optional[str] = None, cache_key: Optional[str] = None,
+                 use_gpu: bool = False):
+        """
+        FAISS vector index over a single PDF.
+
+        This is the expensive part of the pipeline (extraction + embedding)
+        and holds no per-session state, so it can be cached and shared.
+        
+        Args:
+            embeddings: Embedding model used for documents and queries
+            pdf_path: Path to PDF file (may be None when pdf_stream is given)
+            pdf_stream: In-memory PDF content (bytes or binary file object)
+            pdf_name: Display name of the document, used as chunk source
+            index_type: FAISS index type, one of INDEX_TYPES
+            cache_root: Root of the on-disk index cache (None disables it);
+                the index lives in cache_root/<fingerprint>/<cache_key>
+            cache_key: Identifier of the document in the cache, e.g. a hash
+                of its content (computed from the PDF when omitted)
+            use_gpu: Move the built index to GPU 0 when faiss-gpu and a GPU
+                are available (CPU otherwise)
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+            
         self.pdf_path = pdf_path
-        self.google_api_key = google_api_key
+        self.pdf_bytes = self._read_stream(pdf_stream)
+        self.pdf_name = pdf_name or (os.path.basename(pdf_path) if pdf_path else "document.pdf")
+        self.embeddings = embeddings
+        self.index_type = index_type
+        self.use_gpu = use_gpu
+        self.gpu_resources = None
         self.vectorstore = None
-        self.qa_chain = None
         self.documents = []
         
-        # Configure Google API
-        os.environ["GOOGLE_API_KEY"] = google_api_key
+        self.text_splitter = self.create_text_splitter(embeddings)
         
-        # Initialize components
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=google_api_key
-        )
+        chunk_tokens = self.chunk_tokens(embeddings)
+        chunk_chars = chunk_tokens * CHARS_PER_TOKEN if chunk_tokens else CHUNK_SIZE_CHARS
+        self.retrieval_k = max(RETRIEVAL_K, math.ceil(RETRIEVAL_K * CHUNK_SIZE_CHARS / chunk_chars))
+        
+        self.cache_dir = None
+        if cache_root:
+            cache_key = cache_key or hashlib.blake2b(self._read_source(), digest_size=16).hexdigest()
+            self.cache_dir = os.path.join(cache_root, self.fingerprint(), cache_key)
+
+    def fingerprint(self) -> str:
+        """
+        Short hash of everything that determines the contents of the index
         
-        # Use Gemini 1.5 Flash as requested
-        self.llm = GoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=google_api_key,
-            temperature=0.1
+        Part of the on-disk cache path, so a change of embedding model or
+        backend, chunking, index parameters or INDEX_FORMAT_VERSION never
+        serves an index built the old way.
+        
+        Returns:
+            16-character hex string
+        """
+        model = getattr(self.embeddings, "model", None)
+        params = (
+            INDEX_FORMAT_VERSION,
+            getattr(self.embeddings, "model_name", type(self.embeddings).__name__),
+            getattr(model, "backend", None),
+            str(getattr(model, "device", None)),
+            self.chunk_tokens(self.embeddings),
+            CHUNK_SIZE_CHARS,
+            CHUNK_OVERLAP_RATIO,
+            CHUNK_SEPARATORS,
+            self.index_type,
+            HNSW_MIN_CHUNKS, IVFPQ_MIN_CHUNKS, HNSW_M, HNSW_EF_CONSTRUCTION,
+            IVF_NLIST, BINARY_RERANK_FACTOR,
         )
+        return hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def chunk_tokens(embeddings) -> Optional[int]:
+        """
+        Chunk size in tokens that fits the embedding model's input window
+        
+        Args:
+            embeddings: Embedding model used for documents and queries
+            
+        Returns:
+            max_seq_length minus the special tokens ([CLS]/[SEP]) the model's
+            tokenizer adds, or None if the embeddings have no local tokenizer
+        """
+        model = getattr(embeddings, "model", None)
+        if isinstance(model, SentenceTransformer) and model.max_seq_length:
+            return model.max_seq_length - model.tokenizer.num_special_tokens_to_add()
+        return None
+
+    @staticmethod
+    def create_text_splitter(embeddings) -> RecursiveCharacterTextSplitter:
+        """
+        Create a splitter whose chunks fit the embedding model's input window
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", ". ", "! ", "? ", " "]
+        For a local SentenceTransformer model, chunks are measured with its own
+        tokenizer and sized by chunk_tokens(), so no text is truncated (and
+        embedded for nothing) by the model. Other embeddings fall back to
+        CHUNK_SIZE_CHARS-character chunks.
+        
+        Args:
+            embeddings: Embedding model used for documents and queries
+            
+        Returns:
+            Text splitter for process_documents()
+        """
+        chunk_size = DocumentIndex.chunk_tokens(embeddings)
+        if chunk_size:
+            return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                embeddings.model.tokenizer,
+                chunk_size=chunk_size,
+                chunk_overlap=int(chunk_size * CHUNK_OVERLAP_RATIO),
+                separators=CHUNK_SEPARATORS
+            )
+            
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE_CHARS,
+            chunk_overlap=int(CHUNK_SIZE_CHARS * CHUNK_OVERLAP_RATIO),
+            separators=CHUNK_SEPARATORS
         )
 
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
+    @staticmethod
+    def _read_stream(pdf_stream: Optional[Union[BinaryIO, bytes]]) -> Optional[bytes]:
+        """Normalize an in-memory PDF (bytes or file-like object) to bytes"""
+        if pdf_stream is None:
+            return None
+        if isinstance(pdf_stream, (bytes, bytearray, memoryview)):
+            return bytes(pdf_stream)
+        pdf_stream.seek(0)
+        return pdf_stream.read()
+
+    def _read_source(self) -> bytes:
+        """Raw PDF content, read from disk if it is not in memory"""
+        if self.pdf_bytes is not None:
+            return self.pdf_bytes
+        with open(self.pdf_path, "rb") as f:
+            return f.read()
+
+    @property
+    def pdf_source(self) -> Union[str, bytes]:
+        """PDF content to process: in-memory bytes if available, else the file path"""
+        return self.pdf_bytes if self.pdf_bytes is not None else self.pdf_path
+
+    @staticmethod
+    def extract_pages_with_pymupdf(pdf_source: Union[str, bytes]) -> List[str]:
         """
-        Extract text from PDF using multiple methods for better compatibility
+        Extract the text of every page with PyMuPDF
         
         Args:
-            pdf_path: Path to PDF file
+            pdf_source: Path to PDF file or in-memory PDF bytes
             
         Returns:
-            Extracted text content
+            Text of each page in order ("" for pages that failed)
         """
-        text_content = ""
+        if isinstance(pdf_source, bytes):
+            doc = fitz.open(stream=pdf_source, filetype="pdf")
+        else:
+            doc = fitz.open(pdf_source)
+            
+        with doc:
+            logger.info(f"Total pages: {doc.page_count}")
+            page_texts = []
+            for page_num in range(doc.page_count):
+                try:
+                    page_texts.append(doc[page_num].get_text("text"))
+                except Exception as e:
+                    logger.warning(f"Error extracting page {page_num + 1} with PyMuPDF: {e}")
+                    page_texts.append("")
+            return page_texts
+
+    def iter_page_texts(self, pdf_source: Union[str, bytes]) -> Iterator[Tuple[int, str]]:
+        """
+        Extract text from PDF page by page, using multiple methods for better compatibility
+        
+        Pages are yielded as they are extracted, so callers can chunk them
+        without building the whole document text first.
         
-        # Method 1: Try PyPDF2 first
+        Args:
+            pdf_source: Path to PDF file or in-memory PDF bytes
+            
+        Yields:
+            (page number starting at 1, page text) for each page with text
+        """
+        in_memory = isinstance(pdf_source, bytes)
+        
+        # Method 1: Try PyMuPDF first (C extension, ~10x faster than PyPDF2)
         try:
-            logger.info("Trying PyPDF2 for text extraction...")
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                logger.info(f"Total pages: {len(pdf_reader.pages)}")
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content += f"\n--- Page {page_num + 1} ---\n"
-                            text_content += page_text + "\n"
-                    except Exception as e:
-                        logger.warning(f"Error extracting page {page_num + 1}: {e}")
-                        continue
-                        
-            if text_content.strip():
-                logger.info("Successfully extracted text using PyPDF2")
-                return text_content
-                
+            logger.info("Trying PyMuPDF for text extraction...")
+            page_texts = self.extract_pages_with_pymupdf(pdf_source)
         except Exception as e:
-            logger.warning(f"PyPDF2 failed: {e}")
+            logger.warning(f"PyMuPDF failed: {e}")
+            page_texts = []
+            
+        if any(page_text.strip() for page_text in page_texts):
+            logger.info("Successfully extracted text using PyMuPDF")
+            for page_num, page_text in enumerate(page_texts, 1):
+                if page_text.strip():
+                    yield page_num, page_text
+            return
 
-        # Method 2: Try PyMuPDF as fallback
+        # Method 2: Try PyPDF2 as fallback (pure Python, much slower)
+        found_text = False
         try:
-            logger.info("Trying PyMuPDF for text extraction...")
-            doc = fitz.open(pdf_path)
+            logger.info("Trying PyPDF2 for text extraction...")
+            import PyPDF2
             
-            for page_num in range(doc.page_count):
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_source) if in_memory else pdf_source)
+            logger.info(f"Total pages: {len(pdf_reader.pages)}")
+            
+            for page_num, page in enumerate(pdf_reader.pages, 1):
                 try:
-                    page = doc[page_num]
-                    page_text = page.get_text()
-                    if page_text.strip():
-                        text_content += f"\n--- Page {page_num + 1} ---\n"
-                        text_content += page_text + "\n"
+                    page_text = page.extract_text() or ""
                 except Exception as e:
-                    logger.warning(f"Error extracting page {page_num + 1} with PyMuPDF: {e}")
+                    logger.warning(f"Error extracting page {page_num}: {e}")
                     continue
-                    
-            doc.close()
-            
-            if text_content.strip():
-                logger.info("Successfully extracted text using PyMuPDF")
-                return text_content
-                
+                if page_text.strip():
+                    found_text = True
+                    yield page_num, page_text
+                        
         except Exception as e:
-            logger.warning(f"PyMuPDF failed: {e}")
+            logger.warning(f"PyPDF2 failed: {e}")
 
         # If both methods fail
-        if not text_content.strip():
+        if not found_text:
             raise Exception("Cannot extract text from PDF using any available method")
+
+    @staticmethod
+    def clean_text(text: str) -> str:
+        """
+        Normalize whitespace in extracted text
+        
+        Turns tabs, NBSP and control characters into spaces, then collapses
+        runs of spaces and of blank lines (keeping paragraph breaks for the
+        splitter). Letters, diacritics and punctuation are left untouched.
+        
+        Args:
+            text: Raw extracted text
             
-        return text_content
+        Returns:
+            Cleaned text
+        """
+        text = text.translate(_WS_TABLE)
+        text = _INLINE_WS_RE.sub(" ", text)
+        text = _PARAGRAPH_BREAK_RE.sub("\n\n", text)
+        text = _LINE_BREAK_RE.sub("\n", text)
+        return text.strip()
 
     def process_documents(self) -> bool:
         """
-        Process PDF and create vector store
+        Process PDF: extract text, split into chunks and create vector store
+        
+        The in-memory PDF bytes are released afterwards; the index (which
+        may stay cached for a long time) only needs the chunks.
         
         Returns:
             Success status
@@ -133,106 +547,423 @@ class Chatbot:
         try:
             logger.info("Starting document processing...")
             
-            # Step 1: Extract text from PDF
-            logger.info("Step 1: Extracting text from PDF...")
-            text_content = self.extract_text_from_pdf(self.pdf_path)
+            # A previous run (or another worker) already built this index
+            if self.cache_dir and self.load_cached_index():
+                self.move_index_to_gpu()
+                self.warm_up()
+                return True
             
-            if not text_content.strip():
-                raise Exception("No text content extracted from PDF")
-                
-            logger.info(f"Extracted {len(text_content)} characters")
+            # Step 1: Extract text page by page and split each page into
+            # chunks as it arrives; the whole document text is never built
+            logger.info("Step 1: Extracting text from PDF and splitting it into chunks...")
             
-            # Step 2: Split text into chunks
-            logger.info("Step 2: Splitting text into chunks...")
-            text_chunks = self.text_splitter.split_text(text_content)
+            # Chunk text -> page it first appears on. Repeated headers/footers
+            # and boilerplate produce identical chunks; each distinct chunk is
+            # embedded and indexed once
+            chunk_pages = {}
+            num_split = 0
+            num_chars = 0
+            for page_num, page_text in self.iter_page_texts(self.pdf_source):
+                num_chars += len(page_text)
+                page_text = self.clean_text(f"--- Page {page_num} ---\n{page_text}")
+                for chunk in self.text_splitter.split_text(page_text):
+                    num_split += 1
+                    chunk_pages.setdefault(chunk, page_num)
             
-            if not text_chunks:
+            if not chunk_pages:
                 raise Exception("No text chunks created")
                 
-            logger.info(f"Created {len(text_chunks)} text chunks")
+            text_chunks = list(chunk_pages)
+            logger.info(f"Extracted {num_chars} characters, created {len(text_chunks)} text chunks "
+                        f"({num_split - len(text_chunks)} duplicates dropped)")
             
             # Convert to Document objects
             self.documents = [
                 Document(
                     page_content=chunk,
-                    metadata={"source": os.path.basename(self.pdf_path), "chunk_id": i}
+                    metadata={"source": self.pdf_name, "chunk_id": i, "page": page_num}
                 )
-                for i, chunk in enumerate(text_chunks)
+                for i, (chunk, page_num) in enumerate(chunk_pages.items())
             ]
             
-            # Step 3: Create vector store with FAISS
-            logger.info("Step 3: Creating vector store with FAISS...")
-            self.vectorstore = FAISS.from_documents(
-                documents=self.documents,
-                embedding=self.embeddings
+            # Step 2: Create vector store with FAISS
+            logger.info("Step 2: Creating vector store with FAISS...")
+            vectors = self.embed_chunks(text_chunks)
+            index = self.create_faiss_index(vectors.shape[1], len(vectors), self.index_type)
+            if not index.is_trained:
+                index.train(vectors)
+            self.vectorstore = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=InMemoryDocstore(),
+                index_to_docstore_id={},
+                distance_strategy=self.distance_strategy(index)
+            )
+            self.vectorstore.add_embeddings(
+                text_embeddings=zip(text_chunks, vectors),
+                metadatas=[doc.metadata for doc in self.documents]
             )
             
             logger.info("Vector store created successfully")
             
-            # Step 4: Create QA chain
-            logger.info("Step 4: Creating QA chain...")
-            self.qa_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=self.vectorstore.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 4}
-                ),
-                return_source_documents=True,
-                verbose=False
-            )
-            
-            logger.info("QA chain created successfully")
+            if self.cache_dir:
+                self.save_index()
+            self.move_index_to_gpu()
+            self.warm_up()
             return True
             
         except Exception as e:
             logger.error(f"Error in document processing: {e}")
             return False
+            
+        finally:
+            self.pdf_bytes = None
+
+    def load_cached_index(self) -> bool:
+        """
+        Load the vector store saved by save_index() from cache_dir
+        
+        Returns:
+            True if the index was loaded, False if there is no usable cache
+        """
+        if not os.path.exists(os.path.join(self.cache_dir, "index.faiss")):
+            return False
+            
+        try:
+            # The pickled docstore was written by save_index(), not uploaded
+            self.vectorstore = FAISS.load_local(
+                self.cache_dir, self.embeddings, allow_dangerous_deserialization=True
+            )
+            self.vectorstore.distance_strategy = self.distance_strategy(self.vectorstore.index)
+            self.documents = [
+                self.vectorstore.docstore.search(doc_id)
+                for doc_id in self.vectorstore.index_to_docstore_id.values()
+            ]
+            # Mark as recently used for cache pruning
+            os.utime(self.cache_dir)
+            logger.info(f"Loaded cached index from {self.cache_dir} ({len(self.documents)} chunks)")
+            return True
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable index cache {self.cache_dir}: {e}")
+            self.vectorstore = None
+            self.documents = []
+            return False
+
+    def warm_up(self) -> None:
+        """
+        Run one throwaway search so the first question does not pay for it
+        
+        FAISS starts its OpenMP thread pool lazily on the first search, and
+        a freshly loaded index has not been paged in yet.
+        """
+        index = self.vectorstore.index
+        try:
+            index.search(np.zeros((1, index.d), dtype=np.float32), 1)
+        except Exception as e:
+            logger.warning(f"FAISS warm-up search failed: {e}")
+
+    def move_index_to_gpu(self) -> None:
+        """
+        Replace the vector store's index with a GPU copy if use_gpu is set
+        
+        Called after the CPU index is built (and saved, as GPU indexes
+        cannot be serialized). Flat, SQ8 and IVF indexes are supported;
+        failures (no faiss-gpu, no GPU, unsupported index such as HNSW)
+        keep the CPU index.
+        """
+        if not self.use_gpu:
+            return
+            
+        if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+            logger.warning("GPU FAISS requested but not available, using CPU index")
+            return
+            
+        try:
+            # Resources (CUDA streams, scratch memory) are kept with the index
+            self.gpu_resources = faiss.StandardGpuResources()
+            self.vectorstore.index = faiss.index_cpu_to_gpu(self.gpu_resources, 0, self.vectorstore.index)
+            logger.info("Moved FAISS index to GPU 0")
+        except Exception as e:
+            logger.warning(f"Could not move FAISS index to GPU, using CPU index: {e}")
+            self.gpu_resources = None
+
+    def save_index(self) -> None:
+        """
+        Save the vector store to cache_dir
+        
+        Files are written to a temporary directory that is then renamed, so a
+        concurrent load never sees a half-written index. Failures (e.g. a
+        read-only filesystem) are logged and otherwise ignored.
+        """
+        parent = os.path.dirname(os.path.abspath(self.cache_dir))
+        tmp_dir = None
+        try:
+            os.makedirs(parent, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=parent)
+            self.vectorstore.save_local(tmp_dir)
+            os.rename(tmp_dir, self.cache_dir)
+            logger.info(f"Saved index to {self.cache_dir}")
+        except Exception as e:
+            logger.warning(f"Could not save index to {self.cache_dir}: {e}")
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    def reset(self, pdf_path: str, google_api_key: str) -> bool:
+    def embed_chunks(self, texts: List[str]) -> np.ndarray:
         """
-        Reset chatbot with new PDF file
+        Embed chunks with the local model
+        
+        The model batches internally and each batch already runs on all
+        cores, so texts are passed in a single call.
         
         Args:
-            pdf_path: Path to new PDF file
-            google_api_key: Google API key
+            texts: Chunk texts
             
         Returns:
-            Success status
+            (len(texts), dim) float32 array of unit-length vectors, in input order
         """
-        try:
-            self.pdf_path = pdf_path
-            self.google_api_key = google_api_key
+        logger.info(f"Embedding {len(texts)} chunks with {getattr(self.embeddings, 'model_name', 'embedder')}")
+        vectors = np.ascontiguousarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        # Inner product equals cosine similarity only on unit vectors (a no-op
+        # for SentenceTransformerEmbeddings, which already normalizes)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    @staticmethod
+    def distance_strategy(index: faiss.Index) -> DistanceStrategy:
+        """LangChain distance strategy matching a FAISS index's metric"""
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return DistanceStrategy.MAX_INNER_PRODUCT
+        return DistanceStrategy.EUCLIDEAN_DISTANCE
+
+    @staticmethod
+    def create_faiss_index(dim: int, num_vectors: int, index_type: str = "auto") -> faiss.Index:
+        """
+        Create a FAISS index for the given number of chunk embeddings
+        
+        Chunk vectors are unit length, so indexes rank by inner product
+        (= cosine similarity, one dot product per vector), except binary,
+        whose L2 re-rank gives the same order.
+        
+        - flat: exact FP32 scan, fastest for small documents
+        - sq8: flat scan over 8-bit scalar-quantized vectors (4x smaller,
+          int8 SIMD distance kernels); trained on the vectors for per-dimension
+          ranges
+        - hnsw: HNSW graph, ~log(N) distance computations per query
+        - ivfpq_fs: IVF with 4-bit PQ codes in the SIMD "fast scan" layout,
+          where distances are LUT lookups done with in-register shuffles
+          instead of FP32 FMAs; needs training (see process_documents)
+        - binary: IndexLSH without rotation stores the sign bit of each
+          dimension (Hamming/popcount scan over packed codes, 32x less
+          memory traffic); IndexRefineFlat re-ranks the top candidates
+          with exact FP32 distances
+        - auto: flat below HNSW_MIN_CHUNKS, HNSW up to IVFPQ_MIN_CHUNKS,
+          IVF-PQ fast scan above
+        
+        Args:
+            dim: Embedding dimension
+            num_vectors: Number of vectors that will be added
+            index_type: One of INDEX_TYPES
             
-            # Update API key
-            os.environ["GOOGLE_API_KEY"] = google_api_key
+        Returns:
+            Empty FAISS index
+        """
+        if index_type == "auto":
+            if num_vectors < HNSW_MIN_CHUNKS:
+                index_type = "flat"
+            elif num_vectors < IVFPQ_MIN_CHUNKS:
+                index_type = "hnsw"
+            else:
+                index_type = "ivfpq_fs"
             
-            # Reinitialize components with new API key
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
-                google_api_key=google_api_key
-            )
+        logger.info(f"Using {index_type} index for {num_vectors} chunks")
+        
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+            
+        if index_type == "sq8":
+            return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit,
+                                              faiss.METRIC_INNER_PRODUCT)
+            
+        if index_type == "ivfpq_fs":
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQFastScan(quantizer, dim, IVF_NLIST, dim // 4, 4,
+                                             faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = IVF_NPROBE
+            return index
             
-            # Use Gemini 1.5 Flash
-            self.llm = GoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                google_api_key=google_api_key,
-                temperature=0.1
+        if index_type == "binary":
+            binary_index = faiss.IndexLSH(dim, dim, False, False)
+            index = faiss.IndexRefineFlat(binary_index)
+            index.k_factor = BINARY_RERANK_FACTOR
+            return index
+            
+        return faiss.IndexFlatIP(dim)
+
+    def as_retriever(self, k: Optional[int] = None):
+        """Similarity retriever over the indexed chunks (k defaults to retrieval_k)"""
+        return self.vectorstore.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": k or self.retrieval_k}
+        )
+
+
+class Chatbot:
+    def __init__(self, index: DocumentIndex, llm, answer_cache: Optional[ProximityCache] = None):
+        """
+        Initialize RAG chatbot on top of a prebuilt document index.
+
+        Construction is cheap (no extraction or embedding), so a new
+        Chatbot can be created per session around a cached index.
+        
+        Args:
+            index: Processed DocumentIndex to retrieve from
+            llm: LLM used to generate answers
+            answer_cache: Semantic cache of previous answers for this
+                document (may be shared between Chatbots); questions similar
+                to a cached one are answered without retrieval or the LLM
+        """
+        self.index = index
+        self.llm = llm
+        self.answer_cache = answer_cache
+        self.qa_chain = None
+        
+        if index.vectorstore is not None:
+            self.qa_chain = RetrievalQA.from_chain_type(
+                llm=self.llm,
+                chain_type="stuff",
+                retriever=index.as_retriever(),
+                return_source_documents=True,
+                chain_type_kwargs={"prompt": QA_PROMPT},
+                verbose=False
             )
+
+    def answer(self, question: str) -> str:
+        """
+        Run retrieval + generation for a question
+        
+        Unlike ask(), errors are raised rather than turned into a message,
+        so callers (e.g. caches) can tell failures apart from answers.
+        
+        Args:
+            question: User question
             
-            # Process new document
-            success = self.process_documents()
+        Returns:
+            Answer from the chatbot
+        """
+        logger.info(f"Processing question: {question[:100]}...")
+        
+        cached, question_embedding = self._cached_answer(question)
+        if cached is not None:
+            return cached
+        
+        # Get response from QA chain
+        result = self.qa_chain.invoke({"query": question})
+        
+        logger.info("Question processed successfully")
+        return self._cache_answer(question_embedding, self._extract_answer(result))
+
+    async def aanswer(self, question: str) -> str:
+        """
+        Async version of answer()
+        
+        Retrieval and the Gemini call run through the chain's ainvoke, so the
+        event loop is free during the network round-trip and several
+        questions can be in flight at once.
+        
+        Args:
+            question: User question
             
-            if success:
-                logger.info("Chatbot reset successfully")
-            else:
-                logger.error("Failed to reset chatbot")
-                
-            return success
+        Returns:
+            Answer from the chatbot
+        """
+        logger.info(f"Processing question (async): {question[:100]}...")
+        
+        cached, question_embedding = self._cached_answer(question)
+        if cached is not None:
+            return cached
+        
+        result = await self.qa_chain.ainvoke({"query": question})
+        
+        logger.info("Question processed successfully")
+        return self._cache_answer(question_embedding, self._extract_answer(result))
+
+    def _cached_answer(self, question: str):
+        """
+        Look a question up in the answer cache
+        
+        Returns:
+            (cached answer or None, question embedding or None without a cache)
+        """
+        if self.answer_cache is None:
+            return None, None
+        question_embedding = self.index.embeddings.embed_query(question)
+        return self.answer_cache.lookup(question_embedding), question_embedding
+
+    def _cache_answer(self, question_embedding, answer: str) -> str:
+        """Store a freshly generated answer in the answer cache and return it"""
+        if self.answer_cache is not None:
+            self.answer_cache.add(question_embedding, answer)
+        return answer
+
+    @staticmethod
+    def _extract_answer(result: dict) -> str:
+        """Pull the answer text out of a QA chain result"""
+        answer = result.get("result", "Không thể tạo câu trả lời.")
+        
+        # Drop anything the model echoed up to the prompt's final "Trả lời:"
+        _, marker, tail = answer.rpartition("Trả lời:")
+        return tail.strip() if marker else answer
+
+    def stream(self, question: str) -> Iterator[str]:
+        """
+        Answer a question, yielding the answer text as it is generated
+        
+        Retrieval runs first, then the same "stuff" prompt as the QA chain
+        is sent to the LLM's streaming endpoint. A cached answer is yielded
+        in one piece; a generated one is cached once it is complete. Errors
+        are raised, as in answer(), so a failed answer is never cached.
+        
+        Args:
+            question: User question
             
-        except Exception as e:
-            logger.error(f"Error resetting chatbot: {e}")
-            return False
+        Yields:
+            Chunks of the answer text
+        """
+        logger.info(f"Streaming answer for question: {question[:100]}...")
+        
+        cached, question_embedding = self._cached_answer(question)
+        if cached is not None:
+            yield cached
+            return
+        
+        docs = self.qa_chain.retriever.invoke(question)
+        prompt = self._format_prompt(question, docs)
+        
+        chunks = []
+        for chunk in self.llm.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        # Post-process like answer(), so every path caches the same form
+        self._cache_answer(question_embedding, self._extract_answer({"result": "".join(chunks)}))
+
+    def _format_prompt(self, question: str, docs: List[Document]) -> str:
+        """Fill the QA chain's "stuff" prompt with retrieved chunks"""
+        combine_chain = self.qa_chain.combine_documents_chain
+        return combine_chain.llm_chain.prompt.format(
+            context=combine_chain.document_separator.join(doc.page_content for doc in docs),
+            question=question
+        )
+
+    def _precheck(self, question: str) -> Optional[str]:
+        """Reply to a question that must not reach the LLM, or None if it can be answered"""
+        if not self.qa_chain:
+            return NOT_INITIALIZED_MESSAGE
+        if not question.strip():
+            return EMPTY_QUESTION_MESSAGE
+        return None
 
     def ask(self, question: str) -> str:
         """
@@ -242,58 +973,121 @@ class Chatbot:
             question: User question
             
         Returns:
-            Answer from the chatbot
+            Answer from the chatbot, or a user-friendly error message
         """
         try:
-            if not self.qa_chain:
-                return "❌ Chatbot chưa được khởi tạo. Vui lòng tải PDF trước."
-                
-            if not question.strip():
-                return "❓ Vui lòng nhập câu hỏi."
+            reply = self._precheck(question)
+            if reply:
+                return reply
                 
-            logger.info(f"Processing question: {question[:100]}...")
+            return self.answer(question)
             
-            # Enhanced prompt for better Vietnamese responses
-            enhanced_question = f"""
-            Dựa trên nội dung tài liệu được cung cấp, hãy trả lời câu hỏi sau một cách chi tiết và chính xác:
-
-            Câu hỏi: {question}
+        except Exception as e:
+            logger.error(f"Error processing question: {e}")
+            return self.format_error(e)
 
-            Hướng dẫn trả lời:
-            1. Chỉ sử dụng thông tin có trong tài liệu
-            2. Trả lời bằng tiếng Việt
-            3. Nếu không tìm thấy thông tin, hãy nói rõ
-            4. Trích dẫn cụ thể nếu có thể
-            5. Trình bày một cách logic và dễ hiểu
+    async def aask(self, question: str) -> str:
+        """
+        Async version of ask()
+        
+        Args:
+            question: User question
+            
+        Returns:
+            Answer from the chatbot, or a user-friendly error message
+        """
+        try:
+            reply = self._precheck(question)
+            if reply:
+                return reply
+                
+            return await self.aanswer(question)
+            
+        except Exception as e:
+            logger.error(f"Error processing question: {e}")
+            return self.format_error(e)
 
-            Trả lời:
-            """
+    def ask_many(self, questions: List[str]) -> List[str]:
+        """
+        Answer several questions with batched embedding, search and generation
+        
+        Instead of one round of embedding + search + LLM call per question,
+        uncached questions are embedded in one call, searched with one FAISS
+        call over the whole query matrix and sent to the LLM with one
+        batch() call. Errors are reported per question, as in ask().
+        
+        Args:
+            questions: User questions
             
-            # Get response from QA chain
-            result = self.qa_chain.invoke({"query": enhanced_question})
+        Returns:
+            Answers (or user-friendly error messages), in question order
+        """
+        answers = [self._precheck(q) for q in questions]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if not pending:
+            return answers
             
-            answer = result.get("result", "Không thể tạo câu trả lời.")
+        logger.info(f"Processing {len(pending)} questions in a batch...")
+        
+        try:
+            vectorstore = self.index.vectorstore
+            embeddings = np.asarray(
+                self.index.embeddings.embed_documents([questions[i] for i in pending]), dtype=np.float32
+            )
             
-            # Clean up the answer
-            if "Trả lời:" in answer:
-                answer = answer.split("Trả lời:")[-1].strip()
-                
-            logger.info("Question processed successfully")
-            return answer
+            # Answer what we can from the cache
+            if self.answer_cache is not None:
+                for row, i in enumerate(pending):
+                    answers[i] = self.answer_cache.lookup(embeddings[row])
+                rows = [row for row, i in enumerate(pending) if answers[i] is None]
+                embeddings, pending = embeddings[rows], [pending[row] for row in rows]
+                if not pending:
+                    return answers
             
+            k = self.qa_chain.retriever.search_kwargs["k"]
+            _, ids = vectorstore.index.search(embeddings, k)
+            prompts = [
+                self._format_prompt(questions[i], [
+                    vectorstore.docstore.search(vectorstore.index_to_docstore_id[doc_index])
+                    for doc_index in row_ids if doc_index != -1
+                ])
+                for i, row_ids in zip(pending, ids)
+            ]
+            results = self.llm.batch(prompts, return_exceptions=True)
         except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Error processing question: {error_msg}")
-            
-            # Return user-friendly error message
-            if "quota" in error_msg.lower() or "rate" in error_msg.lower():
-                return "❌ Đã vượt quá giới hạn API. Vui lòng thử lại sau hoặc kiểm tra quota API key."
-            elif "permission" in error_msg.lower() or "forbidden" in error_msg.lower():
-                return "❌ Lỗi quyền truy cập API. Vui lòng kiểm tra API key."
-            elif "not found" in error_msg.lower() or "404" in error_msg.lower():
-                return "❌ Model không được hỗ trợ. Vui lòng cập nhật code với model mới."
+            logger.error(f"Error processing question batch: {e}")
+            error = self.format_error(e)
+            return [error if answer is None else answer for answer in answers]
+            
+        for row, (i, result) in enumerate(zip(pending, results)):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing question: {result}")
+                answers[i] = self.format_error(result)
             else:
-                return f"❌ Lỗi xử lý câu hỏi: {error_msg}"
+                answers[i] = self._cache_answer(embeddings[row], self._extract_answer({"result": result}))
+        return answers
+
+    @staticmethod
+    def format_error(error: Exception) -> str:
+        """
+        Convert an exception raised while answering into a user-friendly message
+        
+        Args:
+            error: Exception raised by answer()
+            
+        Returns:
+            Error message to show to the user
+        """
+        error_msg = str(error)
+        
+        if "quota" in error_msg.lower() or "rate" in error_msg.lower():
+            return "❌ Đã vượt quá giới hạn API. Vui lòng thử lại sau hoặc kiểm tra quota API key."
+        elif "permission" in error_msg.lower() or "forbidden" in error_msg.lower():
+            return "❌ Lỗi quyền truy cập API. Vui lòng kiểm tra API key."
+        elif "not found" in error_msg.lower() or "404" in error_msg.lower():
+            return "❌ Model không được hỗ trợ. Vui lòng cập nhật code với model mới."
+        else:
+            return f"❌ Lỗi xử lý câu hỏi: {error_msg}"
 
     def get_document_info(self) -> dict:
         """
@@ -302,13 +1096,13 @@ class Chatbot:
         Returns:
             Document information
         """
-        if not self.documents:
+        if not self.index.documents:
             return {"status": "No document processed"}
             
         return {
-            "total_chunks": len(self.documents),
-            "pdf_path": os.path.basename(self.pdf_path),
-            "has_vectorstore": self.vectorstore is not None,
+            "total_chunks": len(self.index.documents),
+            "pdf_path": self.index.pdf_name,
+            "has_vectorstore": self.index.vectorstore is not None,
             "has_qa_chain": self.qa_chain is not None
         }
 